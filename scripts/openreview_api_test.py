@@ -1,61 +1,139 @@
 import openreview.api
 import getpass
-from collections import defaultdict
+import hashlib
+import json
+import pickle
+import time
+from collections import deque, namedtuple
+from importlib import metadata
+from operator import attrgetter
+from pathlib import Path
 
-def build_conversation_tree(notes):
-    """Build conversation tree structure"""
-    # Organize notes by forum and replyto
-    tree = defaultdict(list)
-    root_notes = []
-    
-    for note in notes:
-        if note.replyto is None:
-            # Root node (main paper or top-level review)
-            root_notes.append(note)
-        else:
-            # Reply node
-            tree[note.replyto].append(note)
-    
-    return {'roots': root_notes, 'replies': dict(tree)}
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# On-disk cache of fetched forum notes
+CACHE_DIR = Path.home() / '.cache' / 'openreview'
+CACHE_TTL = 15 * 60  # seconds
+CACHE_SCHEMA_VERSION = 1
+
+try:
+    CLIENT_VERSION = metadata.version('openreview-py')
+except metadata.PackageNotFoundError:
+    CLIENT_VERSION = 'unknown'
 
 def get_note_type(note):
     """Identify note type"""
     if not note.content:
         return "Unknown"
     
-    content_keys = set(note.content.keys())
+    # content is already a dict; check keys directly instead of building a set
+    content = note.content
     
     # Main paper
-    if 'title' in content_keys and 'authors' in content_keys and 'abstract' in content_keys:
+    if 'title' in content and 'authors' in content and 'abstract' in content:
         return "Paper"
     
     # Decision
-    elif 'decision' in content_keys:
+    elif 'decision' in content:
         return "Decision"
     
     # Meta review
-    elif 'metareview' in content_keys:
+    elif 'metareview' in content:
         return "Meta Review"
     
     # Official review
-    elif 'review' in content_keys or 'rating' in content_keys:
+    elif 'review' in content or 'rating' in content:
         return "Official Review"
     
     # Author response
-    elif 'title' in content_keys and 'comment' in content_keys:
-        title = note.content.get('title', {}).get('value', '').lower()
-        if 'author' in title or 'response' in title:
-            return "Author Response"
-        return "Comment"
-    
-    # Comment
-    elif 'comment' in content_keys:
+    elif 'comment' in content:
+        if 'title' in content:
+            title = content['title'].get('value', '').lower()
+            if 'author' in title or 'response' in title:
+                return "Author Response"
+        # Comment
         return "Comment"
     
     return "Other"
 
-def print_conversation_tree(tree, file_handle, level=0):
-    """Recursively print conversation tree"""
+def note_structure(note):
+    """Collect the full structure of a note as a JSON-serializable dict"""
+    return {
+        "id": note.id,
+        "forum": note.forum,
+        "replyto": note.replyto,
+        "signatures": note.signatures,
+        "readers": note.readers,
+        "writers": note.writers,
+        "invitations": note.invitations,
+        "cdate": note.cdate,
+        "mdate": note.mdate,
+        "content": note.content,
+    }
+
+def dump_json(obj):
+    """Serialize to indented UTF-8 JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+
+# Flat per-note record, built once so the printers never walk Note objects again
+# `index` is the note's dense position in the records list and keys the children table;
+# `sort_key` orders records newest-first without reverse=True
+Record = namedtuple('Record', ['index', 'id', 'replyto', 'cdate', 'sort_key', 'signature', 'type', 'snippet'])
+
+def _snippet(content, keys=('title', 'comment', 'review')):
+    """Get title or content summary (first non-empty field, at most 100 characters)"""
+    if not content:
+        return ""
+    for key in keys:
+        field = content.get(key)
+        if field:
+            value = field.get('value')
+            if value:
+                return value[:100] if len(value) > 100 else value
+    return ""
+
+def build_records(notes):
+    """Convert notes to flat records, classifying each note once"""
+    return [
+        Record(
+            index,
+            note.id,
+            note.replyto,
+            note.cdate,
+            -note.cdate,
+            note.signatures[0] if note.signatures else "Unknown",
+            get_note_type(note),
+            _snippet(note.content),
+        )
+        for index, note in enumerate(notes)
+    ]
+
+def build_conversation_tree(records):
+    """Build conversation tree structure"""
+    # children[i] holds the replies to records[i], so traversal is plain list indexing
+    id_to_index = {record.id: record.index for record in records}
+    children = [[] for _ in records]
+    root_notes = []
+    
+    for record in records:
+        if record.replyto is None:
+            # Root node (main paper or top-level review)
+            root_notes.append(record)
+        else:
+            # Reply node; replies to notes outside the forum are dropped
+            parent = id_to_index.get(record.replyto)
+            if parent is not None:
+                children[parent].append(record)
+    
+    return {'roots': root_notes, 'children': children}
+
+def print_conversation_tree(tree, out, level=0):
+    """Recursively print conversation tree into the `out` list of strings"""
     indent = "  " * level
     
     # Group root nodes by type
@@ -64,7 +142,7 @@ def print_conversation_tree(tree, file_handle, level=0):
     other_notes = []
     
     for root in tree['roots']:
-        note_type = get_note_type(root)
+        note_type = root.type
         if note_type == "Paper":
             paper_notes.append(root)
         elif note_type == "Official Review":
@@ -72,97 +150,134 @@ def print_conversation_tree(tree, file_handle, level=0):
         else:
             other_notes.append(root)
     
-    # Place the main paper first
-    all_sorted_roots = paper_notes
-    
-    # Merge all non-main paper root nodes and sort by time (new to old)
-    non_paper_notes = other_notes + review_notes
-    non_paper_notes.sort(key=lambda x: x.cdate, reverse=True)
-    all_sorted_roots.extend(non_paper_notes)
+    # Place the main paper first, then all non-main paper root nodes sorted by time (new to old)
+    non_paper_notes = sorted(other_notes + review_notes, key=attrgetter('sort_key'))
+    all_sorted_roots = [*paper_notes, *non_paper_notes]
     
     for root in all_sorted_roots:
-        note_type = get_note_type(root)
-        
-        # Get signature info
-        signatures = root.signatures[0] if root.signatures else "Unknown"
-        
-        # Get title or content summary
-        title = ""
-        if root.content:
-            if 'title' in root.content:
-                title = root.content['title'].get('value', '')[:100]
-            elif 'comment' in root.content:
-                title = root.content['comment'].get('value', '')[:100]
-            elif 'review' in root.content:
-                title = root.content['review'].get('value', '')[:100]
-        
-        file_handle.write(f"{indent}[{note_type}] {signatures}\n")
-        file_handle.write(f"{indent}ID: {root.id}\n")
-        if title:
-            file_handle.write(f"{indent}内容: {title}...\n")
-        file_handle.write(f"{indent}创建时间: {root.cdate}\n")
-        file_handle.write("\n")
+        note_type = root.type
+        title = f"{indent}内容: {root.snippet}...\n" if root.snippet else ""
+        out.append(
+            f"{indent}[{note_type}] {root.signature}\n"
+            f"{indent}ID: {root.id}\n"
+            f"{title}"
+            f"{indent}创建时间: {root.cdate}\n\n"
+        )
         
         # Recursively handle replies
-        if root.id in tree['replies']:
-            print_replies(tree['replies'][root.id], tree['replies'], file_handle, level + 1)
+        replies = tree['children'][root.index]
+        if replies:
+            print_replies(replies, tree['children'], out, level + 1)
 
-def print_replies(replies, all_replies, file_handle, level):
-    """Print replies using different sorting strategies by level"""
-    indent = "  " * level
-    
+def print_replies(replies, children, out, level):
+    """Print replies into `out` using different sorting strategies by level"""
     if level == 1:
-        # First-level replies (direct replies to the main paper): sort by type and time
+        # First-level replies (direct replies to the main paper): sort by type and time.
+        # Partition in a single pass; decisions and meta reviews share one bucket.
+        decision_and_meta = []
         review_replies = []
         other_replies = []
-        
+        buckets = {
+            "Decision": decision_and_meta,
+            "Meta Review": decision_and_meta,
+            "Official Review": review_replies,
+        }
         for reply in replies:
-            note_type = get_note_type(reply)
-            if note_type == "Official Review":
-                review_replies.append(reply)
-            else:
-                other_replies.append(reply)
-        
-        # Sort reviews from newest to oldest
-        review_replies.sort(key=lambda x: x.cdate, reverse=True)
-        
-        # Other types (decision, meta review, comment) sorted from newest to oldest
-        other_replies.sort(key=lambda x: x.cdate, reverse=True)
+            buckets.get(reply.type, other_replies).append(reply)
         
         # Show decisions and meta reviews first (newest to oldest), then all other replies (newest to oldest)
-        decision_and_meta = [r for r in other_replies if get_note_type(r) in ["Decision", "Meta Review"]]
-        other_all = [r for r in other_replies if get_note_type(r) not in ["Decision", "Meta Review"]] + review_replies
-        
-        # All other replies sorted from newest to oldest
-        other_all.sort(key=lambda x: x.cdate, reverse=True)
+        decision_and_meta.sort(key=attrgetter('sort_key'))
+        other_all = other_replies + review_replies
+        other_all.sort(key=attrgetter('sort_key'))
         
         sorted_replies = decision_and_meta + other_all
     else:
         # Other levels: sort from earlier to later (natural conversation flow)
-        sorted_replies = sorted(replies, key=lambda x: x.cdate)
+        sorted_replies = sorted(replies, key=attrgetter('cdate'))
     
-    for reply in sorted_replies:
-        note_type = get_note_type(reply)
-        signatures = reply.signatures[0] if reply.signatures else "Unknown"
-        
-        # Get title or content summary
-        title = ""
-        if reply.content:
-            if 'title' in reply.content:
-                title = reply.content['title'].get('value', '')[:100]
-            elif 'comment' in reply.content:
-                title = reply.content['comment'].get('value', '')[:100]
-        
-        file_handle.write(f"{indent}↳ [{note_type}] {signatures}\n")
-        file_handle.write(f"{indent}  ID: {reply.id}\n")
-        if title:
-            file_handle.write(f"{indent}  内容: {title}...\n")
-        file_handle.write(f"{indent}  创建时间: {reply.cdate}\n")
-        file_handle.write("\n")
+    # Depth-first walk with an explicit stack instead of recursion, so deep
+    # threads cannot hit the interpreter recursion limit. Children are pushed
+    # in reverse so they are popped (and printed) in sorted order.
+    stack = deque((reply, level) for reply in reversed(sorted_replies))
+    while stack:
+        reply, lvl = stack.pop()
+        indent = "  " * lvl
+        title = f"{indent}  内容: {reply.snippet}...\n" if reply.snippet else ""
+        out.append(
+            f"{indent}↳ [{reply.type}] {reply.signature}\n"
+            f"{indent}  ID: {reply.id}\n"
+            f"{title}"
+            f"{indent}  创建时间: {reply.cdate}\n\n"
+        )
         
-        # Recursively handle child replies
-        if reply.id in all_replies:
-            print_replies(all_replies[reply.id], all_replies, file_handle, level + 1)
+        # Queue child replies, deeper levels follow natural conversation flow.
+        # Leaves (the common case) stop here; a single child needs no sorting.
+        child_replies = children[reply.index]
+        if not child_replies:
+            continue
+        if len(child_replies) == 1:
+            stack.append((child_replies[0], lvl + 1))
+        else:
+            child_replies = sorted(child_replies, key=attrgetter('cdate'))
+            stack.extend((child, lvl + 1) for child in reversed(child_replies))
+
+def _cache_path(forum_id, identity):
+    """Cache file of a forum as seen by one identity ('anon' or a username)"""
+    if identity != 'anon':
+        # Different users can see different notes; hash the username for the file name
+        identity = hashlib.sha256(identity.encode('utf-8')).hexdigest()[:16]
+    return CACHE_DIR / f"{forum_id}-{identity}.pkl"
+
+def load_cached_notes(forum_id, identity):
+    """Load cached notes of a forum, or None if the cache is missing, stale or incompatible"""
+    cache_path = _cache_path(forum_id, identity)
+    try:
+        if time.time() - cache_path.stat().st_mtime > CACHE_TTL:
+            return None
+        with open(cache_path, 'rb') as f:
+            cached = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    
+    # Only reuse entries written for the same identity, layout and client version
+    if (cached.get('schema') != CACHE_SCHEMA_VERSION
+            or cached.get('forum_id') != forum_id
+            or cached.get('identity') != identity
+            or cached.get('client_version') != CLIENT_VERSION):
+        return None
+    return cached['notes']
+
+def save_cached_notes(forum_id, identity, notes):
+    """Save notes of a forum to the on-disk cache"""
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(_cache_path(forum_id, identity), 'wb') as f:
+            pickle.dump({
+                'schema': CACHE_SCHEMA_VERSION,
+                'forum_id': forum_id,
+                'identity': identity,
+                'client_version': CLIENT_VERSION,
+                'notes': notes,
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except (OSError, pickle.PicklingError) as e:
+        print(f"缓存写入失败: {e}")
+
+def fetch_forum_notes(client, forum_id, identity='anon'):
+    """Fetch the main paper and all notes of a forum with as few requests as possible"""
+    # Cached notes are only shared between runs of the same identity, so anonymous
+    # and authenticated runs never see each other's results
+    notes = load_cached_notes(forum_id, identity)
+    if notes is None:
+        # get_all_notes pages through the whole forum (get_notes stops at the first page);
+        # the forum note itself is part of the result, so no separate get_note round trip
+        notes = client.get_all_notes(forum=forum_id)
+        save_cached_notes(forum_id, identity, notes)
+    else:
+        print(f"使用缓存的notes ({_cache_path(forum_id, identity)})")
+    main_note = next((note for note in notes if note.id == forum_id), None)
+    if main_note is None:
+        main_note = client.get_note(forum_id)
+    return main_note, notes
 
 print("OpenReview API 测试脚本")
 print("=" * 40)
@@ -178,8 +293,8 @@ try:
     print("\n=== 尝试无认证访问 ===")
     client = openreview.api.OpenReviewClient(baseurl='https://api2.openreview.net')
     
-    # Fetch main paper
-    main_note = client.get_note(forum_id)
+    # Fetch main paper together with all related notes (comments, reviews, etc.)
+    main_note, notes = fetch_forum_notes(client, forum_id)
     print("✓ 成功获取主论文!")
     
     print(f"\n=== 主论文信息 ===")
@@ -191,9 +306,7 @@ try:
         abstract = main_note.content['abstract']['value']
         print(f"摘要: {abstract[:300]}...")
     
-    # Get all related notes (comments, reviews, etc.)
     print(f"\n=== 获取相关notes ===")
-    notes = client.get_notes(forum=forum_id)
     print(f"找到 {len(notes)} 条相关notes")
     
     # Categorize and display different types of notes
@@ -205,35 +318,21 @@ try:
     print(f"\n=== 分析Notes结构 ===")
     
     # Write complete note information to a file
-    with open('openreview_notes_structure.txt', 'w', encoding='utf-8') as f:
-        for i, note in enumerate(notes):
-            f.write(f"=== Note {i+1} ===\n")
-            f.write(f"ID: {note.id}\n")
-            f.write(f"Forum: {note.forum}\n")
-            f.write(f"ReplyTo: {note.replyto}\n")
-            f.write(f"Signatures: {note.signatures}\n")
-            f.write(f"Readers: {note.readers}\n")
-            f.write(f"Writers: {note.writers}\n")
-            f.write(f"Invitations: {note.invitations}\n")
-            f.write(f"CDate: {note.cdate}\n")
-            f.write(f"MDate: {note.mdate}\n")
-            f.write(f"Content Keys: {list(note.content.keys()) if note.content else 'None'}\n")
-            f.write(f"Content: {note.content}\n")
-            f.write("\n" + "="*50 + "\n\n")
-            
-            print(f"已分析note ID: {note.id}")
+    with open('openreview_notes_structure.json', 'wb') as f:
+        f.write(dump_json([note_structure(note) for note in notes]))
+        f.write(b"\n")
     
-    print(f"所有notes结构已保存到 openreview_notes_structure.txt 文件")
+    print(f"所有notes结构已保存到 openreview_notes_structure.json 文件")
     
     # Build conversation tree
     print(f"\n=== 构建对话树 ===")
-    conversation_tree = build_conversation_tree(notes)
+    conversation_tree = build_conversation_tree(build_records(notes))
     
-    # Save conversation tree
-    with open('openreview_conversation_tree.txt', 'w', encoding='utf-8') as f:
-        f.write("OpenReview 对话树结构\n")
-        f.write("=" * 50 + "\n\n")
-        print_conversation_tree(conversation_tree, f)
+    # Save conversation tree: collect all output first, then encode and write it in one call
+    out = ["OpenReview 对话树结构\n", "=" * 50 + "\n\n"]
+    print_conversation_tree(conversation_tree, out)
+    with open('openreview_conversation_tree.txt', 'wb') as f:
+        f.write("".join(out).encode('utf-8'))
     
     print(f"对话树已保存到 openreview_conversation_tree.txt 文件")
 
@@ -255,7 +354,7 @@ except Exception as e:
         )
         
         # Repeat the above query logic
-        main_note = client.get_note(forum_id)
+        main_note, notes = fetch_forum_notes(client, forum_id, identity=username)
         print("✓ 认证访问成功!")
         
         print(f"\n=== 主论文信息 ===")
@@ -263,7 +362,6 @@ except Exception as e:
         print(f"标题: {main_note.content['title']['value']}")
         print(f"作者: {', '.join(main_note.content['authors']['value'])}")
         
-        notes = client.get_notes(forum=forum_id)
         print(f"\n找到 {len(notes)} 条相关notes")
         
         for i, note in enumerate(notes):